@@ -33,9 +33,14 @@ class Main:
         self.game_controller.add_view(TunnelView2)
         self.game_controller.current_view_index = start_view
 
+    # build steps per clock tick; one step per 20ms tick gated startup on
+    # the clock rather than the CPU for any non-trivial maze
+    build_steps_per_update = 64
+
     def update(self, dt):
         try:
-            next(self.build)
+            for _ in range(self.build_steps_per_update):
+                next(self.build)
         except StopIteration:
             pyglet.clock.unschedule(self.update)
             self.player = Player(self.maze)
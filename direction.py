@@ -6,14 +6,10 @@ Copyright 2023 Steve Palmer
 
 import random
 import enum
-import collections
 
 import numpy as np
 
-from utils import traced_methods
 
-
-@traced_methods
 @enum.unique
 class Direction(enum.IntEnum):
     """
@@ -96,12 +92,7 @@ class Direction(enum.IntEnum):
         >>> Direction.All.turn_left() == Direction.All
         True
         """
-        result = self >> 1
-        if self & 1:
-            result |= 8
-        result = Direction(result)
-        assert not self or result
-        return result
+        return _TURN_LEFT[self]
 
     def turn_right(self):
         """Turn right.
@@ -119,12 +110,7 @@ class Direction(enum.IntEnum):
         >>> Direction.All.turn_right() == Direction.All
         True
         """
-        result = (self & 7) << 1
-        if self & 8:
-            result |= 1
-        result = Direction(result)
-        assert not self or result
-        return result
+        return _TURN_RIGHT[self]
 
     def reverse(self):
         """Turn around.
@@ -142,9 +128,7 @@ class Direction(enum.IntEnum):
         >>> Direction.All.reverse() == Direction.All
         True
         """
-        result = Direction(self >> 2 | (self & 3) << 2)
-        assert not self or result
-        return result
+        return _REVERSE[self]
 
     @staticmethod
     def range(mask: int = None):
@@ -161,16 +145,28 @@ class Direction(enum.IntEnum):
         3
         """
         if mask is None:
-            result = tuple(_DATA.keys())
+            result = _RANGE_ALL
         else:
-            result = [direction for direction in _DATA if mask & direction]
+            # list copy keeps the masked form's mutable-list contract
+            result = list(_RANGE_BY_MASK[mask & Direction.All])
         return result
 
     @classmethod
     def random(cls):
-        result = random.choice(Direction.range())
-        assert result
-        return result
+        return _RANGE_ALL[random.getrandbits(2)]
+
+    @classmethod
+    def random_in(cls, mask: int):
+        """A random direction from those set in the mask.
+
+        >>> Direction.random_in(Direction.North) == Direction.North
+        True
+        >>> Direction.random_in(Direction.All) in Direction.range()
+        True
+        """
+        options = _RANGE_BY_MASK[mask & Direction.All]
+        assert options
+        return options[random.randrange(len(options))]
 
     def right_angle_bearing(self):
         """
@@ -183,38 +179,89 @@ class Direction(enum.IntEnum):
         >>> Direction.West.right_angle_bearing()
         3
         """
-        try:
-            result = _DATA[self].bearing
-        except KeyError:
-            result = None
-        return result
+        return _BEARING[self]
 
     def offset(self):
         """
         >>> Direction.North.offset()
-        array([0, 1])
+        (0, 1)
         >>> Direction.East.offset()
-        array([1, 0])
+        (1, 0)
         >>> Direction.South.offset()
-        array([ 0, -1])
+        (0, -1)
         >>> Direction.West.offset()
-        array([-1,  0])
+        (-1, 0)
         """
-        return _DATA[self].offset
+        return _OFFSET[self]
 
+    def offset_np(self):
+        """The offset as a shared read-only int8 ndarray.
 
-_DataItem = collections.namedtuple("DataItem", ["bearing", "offset"])
+        The same array is returned on every call; offsets are always in
+        {-1, 0, 1} so int8 keeps downstream grid arithmetic narrow.
+
+        >>> Direction.North.offset_np()
+        array([0, 1], dtype=int8)
+        >>> Direction.North.offset_np() is Direction.North.offset_np()
+        True
+        """
+        return _OFFSET_NP[self]
 
 
-_DATA = collections.OrderedDict(
-    [
-        (Direction.North, _DataItem(0, np.array([0, 1]))),
-        (Direction.East, _DataItem(1, np.array([1, 0]))),
-        (Direction.South, _DataItem(2, np.array([0, -1]))),
-        (Direction.West, _DataItem(3, np.array([-1, 0]))),
-    ]
+# ======================================================================================================================
+# Lookup tables, indexed by the integer value of the direction.
+# Each method above becomes a single subscript, avoiding the bit-twiddling,
+# Direction() construction and dict lookups on the hot paths.
+# Composite values other than Unknown and All have no defined entry.
+# ======================================================================================================================
+
+_RANGE_ALL = (Direction.North, Direction.East, Direction.South, Direction.West)
+
+# All 16 possible answers to Direction.range(mask), precomputed.
+_RANGE_BY_MASK = tuple(
+    tuple(direction for direction in _RANGE_ALL if mask & direction)
+    for mask in range(16)
 )
 
+_TURN_LEFT = [None] * 16
+_TURN_RIGHT = [None] * 16
+_REVERSE = [None] * 16
+_BEARING = [None] * 16
+_OFFSET = [None] * 16
+
+# The rotations are branchless circular shifts within the 4-bit nibble;
+# Unknown (0) and All (15) are fixed points of all three.
+for _direction in Direction:
+    _value = int(_direction)
+    _TURN_LEFT[_value] = Direction(((_value >> 1) | (_value << 3)) & 0xF)
+    _TURN_RIGHT[_value] = Direction(((_value << 1) | (_value >> 3)) & 0xF)
+    _REVERSE[_value] = Direction(((_value >> 2) | (_value << 2)) & 0xF)
+
+for _direction, _bearing, _offset in (
+    (Direction.North, 0, (0, 1)),
+    (Direction.East, 1, (1, 0)),
+    (Direction.South, 2, (0, -1)),
+    (Direction.West, 3, (-1, 0)),
+):
+    _BEARING[_direction] = _bearing
+    _OFFSET[_direction] = _offset
+
+_TURN_LEFT = tuple(_TURN_LEFT)
+_TURN_RIGHT = tuple(_TURN_RIGHT)
+_REVERSE = tuple(_REVERSE)
+_BEARING = tuple(_BEARING)
+_OFFSET = tuple(_OFFSET)
+
+# Shared read-only ndarray offsets, for callers that need ndarray semantics.
+_OFFSET_NP = {
+    _direction: np.asarray(_OFFSET[_direction], dtype=np.int8)
+    for _direction in _RANGE_ALL
+}
+for _array in _OFFSET_NP.values():
+    _array.setflags(write=False)
+
+del _direction, _value, _bearing, _offset, _array
+
 
 __all__ = ["Direction"]
 
@@ -11,12 +11,17 @@ The GameController is mostly about shared state,
 while the GameViews carry most of the behaviour.
 """
 
+import logging
+
 import pyglet
 
 from utils import traced_methods, modlog
 from player import Player
 
 
+_LOG = modlog(__name__)
+
+
 @traced_methods
 class GameView(pyglet.window.Window):
     """
@@ -44,6 +49,7 @@ class GameView(pyglet.window.Window):
         game_controller.window_args["caption"] = old_caption
 
         self.game_controller = game_controller
+        self._controls = game_controller.controls
         self.player = None
         self.active = False
 
@@ -55,6 +61,7 @@ class GameView(pyglet.window.Window):
             self.push_handlers(player)
 
     def entry(self):
+        self._controls = self.game_controller.controls
         self.active = True
         self.set_visible(True)
         if self.player is not None:
@@ -69,11 +76,11 @@ class GameView(pyglet.window.Window):
         self.active = False
 
     def on_key_press(self, key, modifiers):
-        try:
-            modlog(__name__).debug("=============================================")
-            self.dispatch_event(self.game_controller.controls[key])
-        except KeyError:
-            pass
+        event = self._controls.get(key)
+        if event is not None:
+            if _LOG.isEnabledFor(logging.DEBUG):
+                _LOG.debug("=============================================")
+            self.dispatch_event(event)
 
     def on_next_view(self):
         if self.player is not None:
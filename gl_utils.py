@@ -4,6 +4,7 @@ gl_utils.py
 Copyright 2023 Steve Palmer
 """
 
+import collections
 import ctypes
 import pathlib
 
@@ -19,8 +20,22 @@ class GLObjectException(Exception):
     pass
 
 
+# Shared scratch for shader/program info logs; longer logs fall back to a
+# one-off allocation.
+_INFO_LOG_SCRATCH = ctypes.create_string_buffer(4096)
+
+
+def _info_log_buffer(length):
+    if length <= len(_INFO_LOG_SCRATCH):
+        return _INFO_LOG_SCRATCH
+    return ctypes.create_string_buffer(length)
+
+
 @traced_methods
 class GLObject:
+
+    __slots__ = ("_gl_id",)
+
     def __init__(self, gl_id):
         self._gl_id = gl_id
 
@@ -35,6 +50,8 @@ class GLObject:
 @traced_methods
 class GLShader(GLObject):
 
+    __slots__ = ("_shader_type", "_source")
+
     shader_type_name = {
         gl.GL_VERTEX_SHADER: "Vertex Shader",
         gl.GL_GEOMETRY_SHADER: "Geometry Shader",
@@ -51,18 +68,20 @@ class GLShader(GLObject):
             source = source.encode()
         if not isinstance(source, bytes):
             raise TypeError
-        c_source = ctypes.create_string_buffer(source)
-        c_source = ctypes.cast(
-            ctypes.pointer(ctypes.pointer(c_source)),
+        # bytes objects already provide the NUL-terminated C string; no
+        # need to copy them through create_string_buffer.
+        c_source = ctypes.c_char_p(source)
+        c_source_p = ctypes.cast(
+            ctypes.pointer(c_source),
             ctypes.POINTER(ctypes.POINTER(gl.GLchar)),
         )
-        gl.glShaderSource(self.gl_id, 1, c_source, None)
+        gl.glShaderSource(self.gl_id, 1, c_source_p, None)
         gl.glCompileShader(self.gl_id)
         rc = gl.GLint(0)
         gl.glGetShaderiv(self.gl_id, gl.GL_COMPILE_STATUS, ctypes.byref(rc))
         if not rc:
             gl.glGetShaderiv(self.gl_id, gl.GL_INFO_LOG_LENGTH, ctypes.byref(rc))
-            buffer = ctypes.create_string_buffer(rc.value)
+            buffer = _info_log_buffer(rc.value)
             gl.glGetShaderInfoLog(self.gl_id, rc, None, buffer)
             raise GLObjectException(
                 "{}\n{}".format(
@@ -94,6 +113,9 @@ class GLShader(GLObject):
 
 @traced_methods
 class GLProgram(GLObject):
+
+    __slots__ = ("_shaders_empty", "_done_link")
+
     def __init__(self, shaders=None, *, do_link=None, do_use=None):
         if shaders is None:
             shaders = []
@@ -137,7 +159,7 @@ class GLProgram(GLObject):
         gl.glGetProgramiv(self.gl_id, gl.GL_LINK_STATUS, ctypes.byref(rc))
         if not rc:
             gl.glGetProgramiv(self.gl_id, gl.GL_INFO_LOG_LENGTH, ctypes.byref(rc))
-            buffer = ctypes.create_string_buffer(rc.value)
+            buffer = _info_log_buffer(rc.value)
             gl.glGetProgramInfoLog(self.gl_id, rc, None, buffer)
             raise GLObjectException(buffer.value.decode())
         else:
@@ -149,13 +171,78 @@ class GLProgram(GLObject):
         gl.glUseProgram(self.gl_id)
 
 
+# All shapes sharing a vertex dtype share the same attribute layout, so
+# sort the fields by offset once per dtype rather than once per shape.
+_FIELD_ORDER_CACHE = {}
+
+
+def _vertex_attributes(dtype):
+    try:
+        return _FIELD_ORDER_CACHE[dtype]
+    except KeyError:
+        attributes = []
+        for name, (field_dtype, offset) in sorted(
+            dtype.fields.items(), key=lambda item: item[1][1]
+        ):
+            size = 1
+            for dim in field_dtype.shape:
+                size *= dim
+            attributes.append((name, size, offset))
+        attributes = tuple(attributes)
+        _FIELD_ORDER_CACHE[dtype] = attributes
+        return attributes
+
+
+# The VAO and texture most recently bound through the helpers below.
+# Bindings persist in the context between draws, so consecutive draws of
+# the same shape (or texture) can skip the redundant glBind* calls;
+# GLShape.flush() resets both the GL binding and this record.
+_bound_vao = None
+_bound_texture = None
+
+
+def _bind_vertex_array(vao):
+    global _bound_vao
+    if _bound_vao != vao.value:
+        gl.glBindVertexArray(vao)
+        _bound_vao = vao.value
+
+
+def _bind_texture(texture):
+    global _bound_texture
+    if _bound_texture != texture.id:
+        gl.glBindTexture(texture.target, texture.id)
+        _bound_texture = texture.id
+
+
+def _unbind_all():
+    global _bound_vao, _bound_texture
+    gl.glBindVertexArray(0)
+    _bound_vao = None
+    _bound_texture = None
+
+
 @traced_methods
 class GLShape:
+
+    __slots__ = (
+        "vertices",
+        "indices",
+        "indices_size",
+        "mode",
+        "texture",
+        "vao",
+        "vbo",
+        "ebo",
+    )
+
     def __init__(
         self, vertices: np.ndarray, indices: np.ndarray, mode=None, texture=None
     ):
         if mode is None:
             mode = gl.GL_TRIANGLES
+        vertices = np.ascontiguousarray(vertices)
+        indices = np.ascontiguousarray(indices)
         self.vertices = vertices
         self.indices = indices
         self.indices_size = indices.size
@@ -172,7 +259,7 @@ class GLShape:
         gl.glBufferData(
             gl.GL_ARRAY_BUFFER,  # target
             vertices.nbytes,  # size
-            (gl.GLbyte * vertices.nbytes)(*vertices.tobytes()),  # data
+            vertices.ctypes.data_as(ctypes.POINTER(gl.GLbyte)),  # data
             gl.GL_STATIC_DRAW,
         )  # usage
 
@@ -182,20 +269,18 @@ class GLShape:
         gl.glBufferData(
             gl.GL_ELEMENT_ARRAY_BUFFER,
             indices.nbytes,
-            (gl.GLbyte * indices.nbytes)(*indices.tobytes()),
+            indices.ctypes.data_as(ctypes.POINTER(gl.GLbyte)),
             gl.GL_STATIC_DRAW,
         )
 
-        for ind, fld in enumerate(
-            sorted([f for f in vertices.dtype.fields.items()], key=lambda i: i[1][1])
-        ):
+        for ind, (_, size, offset) in enumerate(_vertex_attributes(vertices.dtype)):
             gl.glVertexAttribPointer(
                 ind,  # index
-                vertices[0][fld[0]].size,  # size
+                size,  # size
                 gl.GL_FLOAT,  # type
                 gl.GL_FALSE,  # normalized
                 vertices.itemsize,  # stride
-                ctypes.c_void_p(fld[1][1]),
+                ctypes.c_void_p(offset),
             )  # pointer
             gl.glEnableVertexAttribArray(ind)
 
@@ -209,25 +294,165 @@ class GLShape:
         return "GLShape({}, {}, {})".format(self.vertices, self.indices, self.mode)
 
     def draw(self):
-        gl.glBindVertexArray(self.vao)
+        # No unbinding: the next draw simply replaces the bindings, and
+        # sampling through the shader does not need glEnable(target).
+        # Callers wanting a clean state machine can call GLShape.flush()
+        # once per frame.
+        _bind_vertex_array(self.vao)
         if self.texture is not None:
-            gl.glEnable(self.texture.target)
-            gl.glBindTexture(self.texture.target, self.texture.id)
+            _bind_texture(self.texture)
         gl.glDrawElements(
             self.mode, self.indices_size, gl.GL_UNSIGNED_INT, 0  # mode  # count  # type
         )  # indices
-        gl.glBindVertexArray(0)
-        if self.texture is not None:
-            gl.glBindTexture(self.texture.target, 0)
+
+    @staticmethod
+    def flush():
+        _unbind_all()
 
     def apply_vertex_transform(self, transform):
-        return np.array(
-            [
-                np.dot(transform, pyrr.vector4.create_from_vector3(vertex, 1.0))
-                for vertex in self.vertices["position"]
-            ]
+        positions = self.vertices["position"]
+        homogeneous = np.empty((positions.shape[0], 4), dtype=positions.dtype)
+        homogeneous[:, :3] = positions
+        homogeneous[:, 3] = 1.0
+        # np.dot(transform, v) per vertex is homogeneous @ transform.T in batch
+        return homogeneous @ transform.T
+
+
+@traced_methods
+class GLShapeBatch:
+    """
+    Collects many shapes sharing one vertex layout into a single
+    VBO/EBO/VAO pair, grouped by texture, so a whole scene draws with one
+    vertex-array bind and one glDrawElements per texture group instead of
+    one of each per shape.
+
+    Geometry is accumulated with add() and uploaded once by finalize();
+    the batch is static after that.
+    """
+
+    __slots__ = ("_pending", "_segments", "vao", "vbo", "ebo")
+
+    def __init__(self):
+        self._pending = []
+        self._segments = None
+        self.vao = None
+        self.vbo = None
+        self.ebo = None
+
+    def add(self, vertices: np.ndarray, indices: np.ndarray, mode=None, texture=None):
+        if self._segments is not None:
+            raise RuntimeError("GLShapeBatch already finalized")
+        if mode is None:
+            mode = gl.GL_TRIANGLES
+        self._pending.append(
+            (
+                np.ascontiguousarray(vertices),
+                np.ascontiguousarray(indices, dtype=np.uint32),
+                mode,
+                texture,
+            )
         )
 
+    def finalize(self):
+        if self._segments is not None:
+            raise RuntimeError("GLShapeBatch already finalized")
+        if not self._pending:
+            raise RuntimeError("Nothing added to GLShapeBatch")
+
+        # Offset each shape's indices by its position in the merged VBO,
+        # then order the index buffer so that shapes sharing a (texture,
+        # mode) pair form one contiguous glDrawElements range.
+        vertex_offsets = []
+        offset = 0
+        for vertices, _, _, _ in self._pending:
+            vertex_offsets.append(offset)
+            offset += vertices.shape[0]
+        groups = collections.OrderedDict()
+        for (vertices, indices, mode, texture), vertex_offset in zip(
+            self._pending, vertex_offsets
+        ):
+            groups.setdefault((texture, mode), []).append(indices + vertex_offset)
+
+        vertices = np.concatenate([pending[0] for pending in self._pending])
+        index_chunks = []
+        self._segments = []
+        index_offset = 0
+        for (texture, mode), chunks in groups.items():
+            merged = np.concatenate(chunks)
+            index_chunks.append(merged)
+            if isinstance(texture, str):
+                texture = pyglet.image.load(texture).get_texture()
+            self._segments.append((texture, mode, index_offset, merged.size))
+            index_offset += merged.size
+        indices = np.concatenate(index_chunks)
+        self._pending = None
+
+        self.vao = gl.GLuint(0)
+        gl.glGenVertexArrays(1, ctypes.byref(self.vao))
+        gl.glBindVertexArray(self.vao)
+
+        self.vbo = gl.GLuint(0)
+        gl.glGenBuffers(1, ctypes.byref(self.vbo))
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
+        gl.glBufferData(
+            gl.GL_ARRAY_BUFFER,
+            vertices.nbytes,
+            vertices.ctypes.data_as(ctypes.POINTER(gl.GLbyte)),
+            gl.GL_STATIC_DRAW,
+        )
+
+        self.ebo = gl.GLuint(0)
+        gl.glGenBuffers(1, ctypes.byref(self.ebo))
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+        gl.glBufferData(
+            gl.GL_ELEMENT_ARRAY_BUFFER,
+            indices.nbytes,
+            indices.ctypes.data_as(ctypes.POINTER(gl.GLbyte)),
+            gl.GL_STATIC_DRAW,
+        )
+
+        for ind, (_, size, offset) in enumerate(_vertex_attributes(vertices.dtype)):
+            gl.glVertexAttribPointer(
+                ind,
+                size,
+                gl.GL_FLOAT,
+                gl.GL_FALSE,
+                vertices.itemsize,
+                ctypes.c_void_p(offset),
+            )
+            gl.glEnableVertexAttribArray(ind)
+
+    def draw(self):
+        if self._segments is None:
+            self.finalize()
+        _bind_vertex_array(self.vao)
+        for texture, mode, index_offset, count in self._segments:
+            if texture is not None:
+                _bind_texture(texture)
+            gl.glDrawElements(
+                mode,
+                count,
+                gl.GL_UNSIGNED_INT,
+                ctypes.c_void_p(index_offset * 4),
+            )
+
+
+# Per-dtype singletons for look_at's default up and target vectors,
+# saving two pyrr calls and two allocations per frame.
+_UNIT_Y = {}
+_ZERO3 = {}
+
+
+def _constant_vector3(cache, values, dtype):
+    key = np.dtype(dtype)
+    try:
+        return cache[key]
+    except KeyError:
+        result = np.array(values, dtype=key)
+        result.setflags(write=False)
+        cache[key] = result
+        return result
+
 
 @traced
 def look_at(
@@ -235,25 +460,31 @@ def look_at(
     *,
     direction: np.ndarray = None,
     target: np.ndarray = None,
-    up: np.ndarray = None
+    up: np.ndarray = None,
+    out: np.ndarray = None
 ):
     if up is None:
-        up = pyrr.vector3.create_unit_length_y(dtype=camera.dtype)
+        up = _constant_vector3(_UNIT_Y, (0.0, 1.0, 0.0), camera.dtype)
     if direction is None:
         if target is None:
-            target = pyrr.vector3.create(dtype=camera.dtype)
+            target = _constant_vector3(_ZERO3, (0.0, 0.0, 0.0), camera.dtype)
         direction = pyrr.vector.normalise(camera - target)
     else:
         direction = pyrr.vector.normalise(direction)
     right = pyrr.vector.normalise(pyrr.vector3.cross(up, direction))
     up = pyrr.vector3.cross(direction, right)
-    look_at_1 = pyrr.matrix44.create_identity(dtype=camera.dtype)
-    look_at_1[0, 0:3] = right
-    look_at_1[1, 0:3] = up
-    look_at_1[2, 0:3] = direction
-    look_at_2 = pyrr.matrix44.create_identity(dtype=camera.dtype)
-    look_at_2[0:3, 3] = -camera
-    return np.dot(look_at_1, look_at_2)
+    # Closed form of rotation @ translation: the rotation rows, with the
+    # translation column rotated into camera space.
+    result = np.empty((4, 4), dtype=camera.dtype) if out is None else out
+    result[0, :3] = right
+    result[1, :3] = up
+    result[2, :3] = direction
+    result[3, :3] = 0.0
+    result[0, 3] = -np.dot(right, camera)
+    result[1, 3] = -np.dot(up, camera)
+    result[2, 3] = -np.dot(direction, camera)
+    result[3, 3] = 1.0
+    return result
 
 
 __all__ = (
@@ -262,5 +493,6 @@ __all__ = (
     "GLShader",
     "GLProgram",
     "GLShape",
+    "GLShapeBatch",
     "look_at",
 )
@@ -4,10 +4,8 @@ maze.py
 Copyright 2023 Steve Palmer
 """
 
-import itertools
 import collections.abc
 import random
-import weakref
 
 import numpy as np
 
@@ -22,6 +20,7 @@ from utils import (
 )
 
 from direction import Direction
+from maze_kernels import build_kernel, wall_vertices_kernel
 
 
 class RoomWallError(Exception):
@@ -36,6 +35,21 @@ class RoomError(Exception):
     pass
 
 
+# ======================================================================================================================
+# Lookup tables, indexed by the 4-bit walls value (and direction value for
+# _CAN_MOVE).  Only 16 wall masks exist, so the per-room queries reduce to
+# a table subscript.
+# ======================================================================================================================
+
+_EXITS = tuple(tuple(Direction.range(~walls & Direction.All)) for walls in range(16))
+
+_SEALED = tuple(walls == Direction.All for walls in range(16))
+
+_CAN_MOVE = tuple(
+    tuple(not walls & direction for direction in range(16)) for walls in range(16)
+)
+
+
 @checked_methods
 @traced_methods
 class Room:
@@ -103,7 +117,8 @@ class Room:
         self._walls = walls
         self._egress = egress
         self._distance = 0
-        self._observers = weakref.WeakSet()
+        self._walls_observers = []
+        self._egress_observers = []
 
     @do_not_trace
     @invariant_checker
@@ -137,33 +152,24 @@ class Room:
         'Room(egress=N)'
         """
         fields = []
-        try:
-            walls = self._walls
-            if walls != 0:
-                field = "walls="
-                if walls & Direction.North:
-                    field += "N"
-                if walls & Direction.South:
-                    field += "S"
-                if walls & Direction.East:
-                    field += "E"
-                if walls & Direction.West:
-                    field += "W"
-                fields.append(field)
-        except Exception:
-            pass
-        try:
-            egress = self._egress
-            if egress:
-                fields.append("egress=" + str(egress))
-        except Exception:
-            pass
-        try:
-            distance = self._distance
-            if distance:
-                fields.append("distance=" + str(distance))
-        except Exception:
-            pass
+        walls = self._walls
+        if walls != 0:
+            field = "walls="
+            if walls & Direction.North:
+                field += "N"
+            if walls & Direction.South:
+                field += "S"
+            if walls & Direction.East:
+                field += "E"
+            if walls & Direction.West:
+                field += "W"
+            fields.append(field)
+        egress = self._egress
+        if egress:
+            fields.append("egress=" + str(egress))
+        distance = self._distance
+        if distance:
+            fields.append("distance=" + str(distance))
         try:
             self._check()
         except Exception as excp:
@@ -183,11 +189,8 @@ class Room:
         assert walls & self._egress == 0
         if self._walls != walls:
             self._walls = walls
-            for observer in self._observers.copy():
-                try:
-                    observer.walls_update(self, walls)
-                except AttributeError:
-                    pass
+            for callback in self._walls_observers:
+                callback(self, walls)
 
     @query
     def is_sealed(self):
@@ -198,7 +201,7 @@ class Room:
         >>> Room().is_sealed()
         True
         """
-        return self.walls == Direction.All
+        return _SEALED[self._walls]
 
     @query
     def can_move(self, direction):
@@ -216,7 +219,7 @@ class Room:
         False
         """
         assert direction
-        return self._walls & direction == 0
+        return _CAN_MOVE[self._walls][direction]
 
     @procedure
     def remove_wall(self, direction):
@@ -259,13 +262,13 @@ class Room:
     def exits(self):
         """
         >>> Room().exits()
-        []
+        ()
         >>> r= Room()
         >>> r.remove_wall(Direction.North)
-        >>> r.exits() == [Direction.North]
+        >>> r.exits() == (Direction.North,)
         True
         """
-        return Direction.range(~self._walls)
+        return _EXITS[self._walls]
 
     @property
     def egress(self):
@@ -279,11 +282,8 @@ class Room:
             self.remove_wall(direction)
         if self._egress != direction:
             self._egress = direction
-            for observer in self._observers.copy():
-                try:
-                    observer.egress_update(self, direction)
-                except AttributeError:
-                    pass
+            for callback in self._egress_observers:
+                callback(self, direction)
 
     @property
     def distance(self):
@@ -296,10 +296,73 @@ class Room:
         self._distance = distance
 
     def attach(self, observer):
-        self._observers.add(observer)
+        # resolve the callbacks once here, rather than per notification;
+        # observers are expected to outlive the room, so plain bound
+        # methods are held instead of weak references
+        callback = getattr(observer, "walls_update", None)
+        if callback is not None:
+            self._walls_observers.append(callback)
+        callback = getattr(observer, "egress_update", None)
+        if callback is not None:
+            self._egress_observers.append(callback)
 
     def detatch(self, observer):
-        self._observers.remove(observer)
+        self._walls_observers[:] = [
+            callback
+            for callback in self._walls_observers
+            if callback.__self__ is not observer
+        ]
+        self._egress_observers[:] = [
+            callback
+            for callback in self._egress_observers
+            if callback.__self__ is not observer
+        ]
+
+
+class _RoomView(Room):
+    """
+    A Room bound to one cell of the maze's walls/egress/distance arrays.
+
+    The inherited Room behaviour (including observer notification) is kept
+    by presenting the underlying array cells through the attribute names
+    the Room methods use; the room itself stores nothing but its binding.
+    """
+
+    def __init__(self, maze, position):
+        self._maze = maze
+        self._position = position
+
+    @property
+    def _walls(self):
+        return int(self._maze._walls[self._position])
+
+    @_walls.setter
+    def _walls(self, walls):
+        self._maze._walls[self._position] = walls
+
+    @property
+    def _egress(self):
+        return Direction(int(self._maze._egress[self._position]))
+
+    @_egress.setter
+    def _egress(self, egress):
+        self._maze._egress[self._position] = egress
+
+    @property
+    def _distance(self):
+        return int(self._maze._distance[self._position])
+
+    @_distance.setter
+    def _distance(self, distance):
+        self._maze._distance[self._position] = distance
+
+    @property
+    def _walls_observers(self):
+        return self._maze._walls_observers.setdefault(self._position, [])
+
+    @property
+    def _egress_observers(self):
+        return self._maze._egress_observers.setdefault(self._position, [])
 
 
 @traced_methods
@@ -309,55 +372,87 @@ class Maze(collections.abc.MutableMapping):
 
     Essentially it is a mapping from positions to Rooms.
     For convenience, many of the methods on Rooms are repeated, parameterised by the room position.
+
+    Room state is held as structure-of-arrays: one uint8 cell per room for
+    walls and for egress, plus an int32 distance grid.  __getitem__ returns
+    a lightweight Room view onto those cells; the per-position methods
+    below index the arrays directly.
     """
 
     def __init__(self, shape: np.ndarray):
         super().__init__()
-        self._rooms = np.empty(shape, dtype=np.object_)
-        for p in self:
-            self[p] = Room()
+        shape = tuple(int(limit) for limit in shape)
+        self._walls = np.full(shape, int(Direction.All), dtype=np.uint8)
+        self._egress = np.zeros(shape, dtype=np.uint8)
+        self._distance = np.zeros(shape, dtype=np.int32)
+        self._shape = np.asarray(shape)
+        self._shape.setflags(write=False)
+        self._walls_observers = {}
+        self._egress_observers = {}
 
     # Methods to implement the mapping
 
     def __len__(self):
-        return self._rooms.size
+        return self._walls.size
 
     def __getitem__(self, key: np.ndarray):
-        return self._rooms[tuple(key)]
+        return _RoomView(self, tuple(key))
 
     def __setitem__(self, key: np.ndarray, value: Room):
-        self._rooms[tuple(key)] = value
+        key = tuple(key)
+        self._walls[key] = int(value.walls)
+        self._egress[key] = int(value.egress)
+        self._distance[key] = int(value.distance)
 
     def __delitem__(self, key: np.ndarray):
         raise RuntimeError
 
     def __iter__(self):
-        for position in itertools.product(
-            *[range(limit) for limit in self._rooms.shape]
-        ):
-            yield np.array(position)
+        # plain int tuples; callers needing ndarray arithmetic convert locally
+        return iter(np.ndindex(*self._walls.shape))
 
     def __contains__(self, key: np.ndarray):
-        return np.all(0 <= key) and np.all(key < self._rooms.shape)
+        key = tuple(key)
+        shape = self._walls.shape
+        return 0 <= key[0] < shape[0] and 0 <= key[1] < shape[1]
 
     # Other Features
 
     @property
     def shape(self):
-        """shape of maze"""
-        return np.array(self._rooms.shape)
+        """shape of maze, as a shared read-only ndarray"""
+        return self._shape
 
     def is_sealed(self, position: np.ndarray):
-        return self[position].is_sealed()
+        return _SEALED[self._walls[tuple(position)]]
 
     def can_move(self, position: np.ndarray, direction: Direction):
-        return self[position].can_move(direction)
+        return _CAN_MOVE[self._walls[tuple(position)]][direction]
 
     def remove_wall(self, position: np.ndarray, direction: Direction):
-        self[position].remove_wall(direction)
+        key = tuple(position)
+        walls = int(self._walls[key])
+        if walls & direction:
+            walls &= ~direction
+            self._walls[key] = walls
+            callbacks = self._walls_observers.get(key)
+            if callbacks:
+                room = _RoomView(self, key)
+                for callback in callbacks:
+                    callback(room, walls)
 
     def exits(self, position: np.ndarray):
-        return self[position].exits()
+        return _EXITS[self._walls[tuple(position)]]
+
+    # whole-maze queries, answered in one vectorized pass
+
+    def sealed_mask(self):
+        """Boolean grid of the rooms that still have all four walls."""
+        return self._walls == Direction.All
+
+    def can_move_mask(self, direction: Direction):
+        """Boolean grid of the rooms open in the given direction."""
+        return (self._walls & int(direction)) == 0
 
     # maze processes
 
@@ -365,35 +460,26 @@ class Maze(collections.abc.MutableMapping):
         """
         Building the maze is implemented as a coroutine
         to allow the visualization of the build progress.
+
+        The carving itself runs as a single pass over a plain uint8 grid
+        (JIT compiled when numba is available); the coroutine then replays
+        the recorded steps through the Room interface so that observers
+        still see the build progress one room at a time.
         """
-        self._start = np.zeros_like(self._rooms.shape)
-        self._start[0] = random.randrange(self._rooms.shape[0])
-        position = self._start
-        egress = Direction.South
-        distance = 1
-        while position in self:
+        self._start = (random.randrange(self._walls.shape[0]), 0)
+        records = build_kernel(
+            int(self._walls.shape[0]),
+            int(self._walls.shape[1]),
+            self._start[0],
+        )
+        for record in records:
+            position = (int(record[0]), int(record[1]))
             room = self[position]
-            room.egress = egress
-            room.distance = distance
+            room.egress = Direction(int(record[2]))
+            room.distance = int(record[3])
             yield position
-            options = {}
-            for direction in Direction.range():
-                if direction != egress:
-                    new_position = position + direction.offset()
-                    if new_position in self:
-                        if self.is_sealed(new_position):
-                            options[direction] = new_position
-            if options:
-                direction = random.choice(tuple(options.keys()))
-                room.remove_wall(direction)
-                position = options[direction]
-                egress = direction.reverse()
-                distance += 1
-            else:
-                position += egress.offset()
-                if position in self:
-                    egress = self[position].egress
-                    distance = self[position].distance
+            if record[4]:
+                room.remove_wall(Direction(int(record[4])))
 
     def random_pose(self):
         """
@@ -401,48 +487,22 @@ class Maze(collections.abc.MutableMapping):
         Does not start player facing the wall.
         """
         position = self._start
-        while self[position].distance < np.sum(self._rooms.shape) * 2:
-            position = np.array(
-                [random.randrange(limit) for limit in self._rooms.shape]
+        while self[position].distance < sum(self._walls.shape) * 2:
+            position = tuple(
+                random.randrange(limit) for limit in self._walls.shape
             )
-        direction = random.choice(self.exits(position))
+        direction = Direction.random_in(~self[position].walls)
         return (position, direction)
 
     def wall_2d_vertices(self, thickness=0.1):
         """
         Walk the maze building a 2D description of the wall, starting from the exit.
 
-        The result is first built up in the positions list.
-        The Walker follows the left hand wall.
+        The walker follows the left hand wall; the walk itself runs in
+        wall_vertices_kernel on the walls grid (JIT compiled when numba
+        is available).
         """
-        wall_offset = {
-            Direction.North: np.array([thickness, 1.0 - thickness]),
-            Direction.East: np.array([1.0 - thickness, 1.0 - thickness]),
-            Direction.South: np.array([1.0 - thickness, thickness]),
-            Direction.West: np.array([thickness, thickness]),
-        }
-        walker_position = self._start.copy()
-        walker_direction = Direction.North
-        positions = [walker_position + np.array([thickness, 0.0])]
-        while walker_position in self:
-            room = self[walker_position]
-            left = walker_direction.turn_left()
-            if room.can_move(left):
-                positions.append(walker_position + wall_offset[left])
-                walker_direction = left
-            elif room.can_move(walker_direction):
-                pass
-            else:
-                positions.append(walker_position + wall_offset[walker_direction])
-                right = walker_direction.turn_right()
-                if room.can_move(right):
-                    walker_direction = right
-                else:
-                    positions.append(walker_position + wall_offset[right])
-                    walker_direction = walker_direction.reverse()
-            walker_position += walker_direction.offset()
-        positions.append(self._start + np.array([1.0 - thickness, 0.0]))
-        return np.array(positions, dtype=np.float32)
+        return wall_vertices_kernel(self._walls, self._start[0], thickness)
 
 
 __all__ = ("Room", "Maze")
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+maze_kernels.py
+Copyright 2023 Steve Palmer
+
+Numeric kernels behind the Maze processes.
+
+The kernels work on plain integer grids and scalars only, so that numba
+can compile them in nopython mode when it is installed.  Without numba
+they run unchanged as ordinary Python.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; the kernels also run as plain Python
+
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+
+        def decorate(func):
+            return func
+
+        return decorate
+
+
+@njit(cache=True)
+def build_kernel(size_x: int, size_y: int, start_x: int):
+    """
+    Carve a maze on a plain uint8 wall grid, recording one row per visited
+    room: (x, y, egress bits, distance, wall bits carved on leaving or 0).
+
+    Directions are passed as their raw bit values since the kernel must not
+    touch Python-level Direction objects when JIT compiled.
+    """
+    dir_bits = np.array([1, 2, 4, 8], dtype=np.uint8)  # N, E, S, W
+    dir_dx = np.array([0, 1, 0, -1], dtype=np.int8)
+    dir_dy = np.array([1, 0, -1, 0], dtype=np.int8)
+    reverse = np.zeros(16, dtype=np.uint8)
+    reverse[1], reverse[2], reverse[4], reverse[8] = 4, 8, 1, 2
+
+    walls = np.full((size_x, size_y), 15, dtype=np.uint8)
+    egress_grid = np.zeros((size_x, size_y), dtype=np.uint8)
+    distance_grid = np.zeros((size_x, size_y), dtype=np.int32)
+    records = np.zeros((2 * size_x * size_y + 2, 5), dtype=np.int32)
+    options = np.empty(4, dtype=np.int32)
+
+    x, y = start_x, 0
+    egress = 4  # South, out of the maze
+    distance = 1
+    count = 0
+    while 0 <= x < size_x and 0 <= y < size_y:
+        walls[x, y] &= 15 ^ egress
+        egress_grid[x, y] = egress
+        distance_grid[x, y] = distance
+        records[count, 0] = x
+        records[count, 1] = y
+        records[count, 2] = egress
+        records[count, 3] = distance
+        n_options = 0
+        for i in range(4):
+            if dir_bits[i] != egress:
+                new_x = x + dir_dx[i]
+                new_y = y + dir_dy[i]
+                if 0 <= new_x < size_x and 0 <= new_y < size_y:
+                    if walls[new_x, new_y] == 15:
+                        options[n_options] = i
+                        n_options += 1
+        if n_options:
+            i = options[np.random.randint(n_options)]
+            carve = dir_bits[i]
+            walls[x, y] &= 15 ^ carve
+            records[count, 4] = carve
+            x += dir_dx[i]
+            y += dir_dy[i]
+            egress = reverse[carve]
+            distance += 1
+        else:
+            for i in range(4):
+                if dir_bits[i] == egress:
+                    x += dir_dx[i]
+                    y += dir_dy[i]
+                    break
+            if 0 <= x < size_x and 0 <= y < size_y:
+                egress = egress_grid[x, y]
+                distance = distance_grid[x, y]
+        count += 1
+    return records[:count]
+
+
+@njit(cache=True)
+def wall_vertices_kernel(walls, start_x: int, thickness: float):
+    """
+    Follow the left hand wall from the maze exit, emitting the 2D wall
+    outline into a preallocated float32 vertex array.
+
+    Directions are handled as ordinals (N=0, E=1, S=2, W=3) with lookup
+    tables for turns, offsets and wall corner positions, so the walker
+    compiles in nopython mode.
+    """
+    size_x, size_y = walls.shape
+    dir_bits = np.array([1, 2, 4, 8], dtype=np.uint8)  # N, E, S, W
+    dir_dx = np.array([0, 1, 0, -1], dtype=np.int8)
+    dir_dy = np.array([1, 0, -1, 0], dtype=np.int8)
+    left_of = np.array([3, 0, 1, 2], dtype=np.int8)
+    right_of = np.array([1, 2, 3, 0], dtype=np.int8)
+    reverse_of = np.array([2, 3, 0, 1], dtype=np.int8)
+    corner = np.empty((4, 2), dtype=np.float64)
+    corner[0, 0] = thickness
+    corner[0, 1] = 1.0 - thickness
+    corner[1, 0] = 1.0 - thickness
+    corner[1, 1] = 1.0 - thickness
+    corner[2, 0] = 1.0 - thickness
+    corner[2, 1] = thickness
+    corner[3, 0] = thickness
+    corner[3, 1] = thickness
+
+    # at most two vertices per directed room entry
+    out = np.empty((8 * size_x * size_y + 4, 2), dtype=np.float32)
+    n = 0
+    x, y = start_x, 0
+    d = 0  # North, into the maze
+    out[n, 0] = x + thickness
+    out[n, 1] = y
+    n += 1
+    while 0 <= x < size_x and 0 <= y < size_y:
+        room_walls = walls[x, y]
+        left = left_of[d]
+        if not room_walls & dir_bits[left]:
+            out[n, 0] = x + corner[left, 0]
+            out[n, 1] = y + corner[left, 1]
+            n += 1
+            d = left
+        elif not room_walls & dir_bits[d]:
+            pass
+        else:
+            out[n, 0] = x + corner[d, 0]
+            out[n, 1] = y + corner[d, 1]
+            n += 1
+            right = right_of[d]
+            if not room_walls & dir_bits[right]:
+                d = right
+            else:
+                out[n, 0] = x + corner[right, 0]
+                out[n, 1] = y + corner[right, 1]
+                n += 1
+                d = reverse_of[d]
+        x += dir_dx[d]
+        y += dir_dy[d]
+    out[n, 0] = start_x + 1.0 - thickness
+    out[n, 1] = 0.0
+    n += 1
+    return out[:n]
+
+
+__all__ = ("njit", "build_kernel", "wall_vertices_kernel")
@@ -12,22 +12,21 @@ from game_controller import GameView
 
 
 @traced_methods
-class RoomSprite(pyglet.sprite.Sprite):
-    def __init__(self, planview, position: np.ndarray, room, *args, **kwargs):
+class RoomTile:
+    """
+    Lightweight per-room observer.
+
+    The rooms are drawn from one shared vertex list on the PlanView; a
+    tile just remembers which quad is its and forwards wall changes.
+    """
+
+    def __init__(self, planview, index: int, room):
         self.planview = planview
-        self.room_position = position
-        super().__init__(planview.room_image(room.walls), *args, **kwargs)
-        self.view_update()
+        self.index = index
         room.attach(self)
 
-    def view_update(self):
-        self.planview.switch_to()
-        self.scale = self.planview.sprite_scale
-        self.position = self.planview.position2xy(self.room_position)
-
     def walls_update(self, _, walls):
-        self.planview.switch_to()
-        self.image = self.planview.room_image(walls)
+        self.planview.room_walls_update(self.index, walls)
 
 
 @traced_methods
@@ -43,19 +42,22 @@ class PlayerSprite(pyglet.sprite.Sprite):
         self.view_update()
 
     def view_update(self):
-        self.planview.switch_to()
+        if not self.planview._in_bulk:
+            self.planview.switch_to()
         self.scale = self.planview.sprite_scale
         self.direction_update()
         self.position_update()
 
     def direction_update(self):
-        self.planview.switch_to()
+        if not self.planview._in_bulk:
+            self.planview.switch_to()
         self.image = self.planview.player_image(
             self.player.direction.right_angle_bearing()
         )
 
     def position_update(self):
-        self.planview.switch_to()
+        if not self.planview._in_bulk:
+            self.planview.switch_to()
         self.position = self.planview.position2xy(self.player.position)
 
 
@@ -69,33 +71,86 @@ class PlanView(GameView):
         self._tile_size = room_atlas_img.height
         self._room_atlas = pyglet.image.ImageGrid(
             room_atlas_img, 1, 16, column_padding=2
-        )
+        ).get_texture_sequence()
         assert self._room_atlas[0].width == self._tile_size
+        # one texture coordinate set per wall mask, all on one texture
+        self._room_uv = tuple(
+            tuple(self._room_atlas[walls].tex_coords) for walls in range(16)
+        )
 
         # Player Image Stuff
         player_atlas_img = pyglet.image.load("player_atlas.png")
         assert self._tile_size == player_atlas_img.height
         assert player_atlas_img.width / self._tile_size == 4
         self._player_atlas = pyglet.image.ImageGrid(player_atlas_img, 1, 4)
+        # materialized once; ImageGrid indexing is not free and this is
+        # hit on every turn of the player
+        self._player_images = tuple(self._player_atlas[i] for i in range(4))
 
         # Scaling stuff
         self.update_scaling()
 
+        # set while a bulk sprite update runs with the context already
+        # current, so the per-sprite updates skip their switch_to
+        self._in_bulk = False
+
         # Build the picture
+        # The whole maze is one static quad list on the room atlas
+        # texture; wall changes only rewrite the texture coordinates of
+        # the room's quad.  The iteration order of the maze matches the
+        # row-major order of the quads.
         self.batch = pyglet.graphics.Batch()
         background = pyglet.graphics.OrderedGroup(0)
+        room_group = pyglet.sprite.SpriteGroup(
+            self._room_atlas[0].owner,
+            pyglet.gl.GL_SRC_ALPHA,
+            pyglet.gl.GL_ONE_MINUS_SRC_ALPHA,
+            parent=background,
+        )
+        self.switch_to()
+        room_count = len(game_controller.maze)
+        uvs = []
         self.rooms = []
-        for position, room in game_controller.maze.items():
-            self.rooms.append(
-                RoomSprite(self, position, room, batch=self.batch, group=background)
-            )
+        for i, (position, room) in enumerate(game_controller.maze.items()):
+            uvs.extend(self._room_uv[room.walls])
+            self.rooms.append(RoomTile(self, i, room))
+        self._room_vlist = self.batch.add(
+            4 * room_count,
+            pyglet.gl.GL_QUADS,
+            room_group,
+            ("v2i/dynamic", self._room_vertices().reshape(-1).tolist()),
+            ("t3f/dynamic", uvs),
+        )
         self.player_sprite = None
 
-    def room_image(self, i: int):
-        return self._room_atlas[i]
+    def _room_vertices(self):
+        """Corner coordinates for every room quad, in one broadcast."""
+        maze_shape = self.game_controller.maze.shape
+        coords = (
+            np.stack(
+                np.meshgrid(
+                    np.arange(maze_shape[0]), np.arange(maze_shape[1]), indexing="ij"
+                ),
+                axis=-1,
+            ).reshape(-1, 2)
+            * self.scale
+            + self.offset
+        )
+        vertices = np.empty((len(coords), 4, 2), dtype=np.int32)
+        vertices[:, 0, 0] = vertices[:, 3, 0] = coords[:, 0]
+        vertices[:, 1, 0] = vertices[:, 2, 0] = coords[:, 0] + self.scale
+        vertices[:, 0, 1] = vertices[:, 1, 1] = coords[:, 1]
+        vertices[:, 2, 1] = vertices[:, 3, 1] = coords[:, 1] + self.scale
+        return vertices
+
+    def room_walls_update(self, index: int, walls: int):
+        self.switch_to()
+        self._room_vlist.tex_coords[index * 12:(index + 1) * 12] = self._room_uv[
+            walls
+        ]
 
     def player_image(self, i: int):
-        return self._player_atlas[i]
+        return self._player_images[i]
 
     def update_scaling(self):
         window_shape = np.array([self.width, self.height])
@@ -106,8 +161,8 @@ class PlanView(GameView):
         self.scale = self.sprite_scale * self._tile_size
         self.offset = (window_shape - maze_shape * self.scale) // 2
 
-    def position2xy(self, position: np.ndarray):
-        return tuple((position * self.scale) + self.offset)
+    def position2xy(self, position):
+        return tuple((np.asarray(position) * self.scale) + self.offset)
 
     def add_player(self, player):
         super().add_player(player)
@@ -146,10 +201,13 @@ class PlanView(GameView):
             self.switch_to()
             super().on_resize(width, height)
             self.update_scaling()
-            for room in self.rooms:
-                room.view_update()
-            if self.player_sprite is not None:
-                self.player_sprite.view_update()
+            self._room_vlist.vertices[:] = self._room_vertices().reshape(-1).tolist()
+            self._in_bulk = True
+            try:
+                if self.player_sprite is not None:
+                    self.player_sprite.view_update()
+            finally:
+                self._in_bulk = False
 
 
 __all__ = "PlanView"
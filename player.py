@@ -50,7 +50,9 @@ class Player(pyglet.event.EventDispatcher):
     def on_forwards_step(self):
         self.step_count += 1
         if self.maze.can_move(self._position, self._direction):
-            self._position += self._direction.offset()
+            x, y = self._position
+            dx, dy = self._direction.offset()
+            self._position = (x + dx, y + dy)
             self.dispatch_event("on_position_update")
             if self._position not in self.maze:
                 self.dispatch_event("on_maze_exit")
@@ -58,7 +60,9 @@ class Player(pyglet.event.EventDispatcher):
     def on_backwards_step(self):
         self.step_count += 1
         if self.maze.can_move(self._position, self._direction.reverse()):
-            self._position -= self.direction.offset()
+            x, y = self._position
+            dx, dy = self._direction.offset()
+            self._position = (x - dx, y - dy)
             self.dispatch_event("on_position_update")
             if self._position not in self.maze:
                 self.dispatch_event("on_maze_exit")
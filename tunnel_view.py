@@ -4,49 +4,118 @@ tunnel_view.py
 Copyright 2023 Steve Palmer
 """
 
+import functools
+
 import pyglet
 import numpy as np
 
 from utils import traced_methods, do_not_trace
+from direction import Direction
 from game_controller import GameView
 
 
+_EXIT = 16  # ray marker for stepping out of the maze
+
+
+@functools.lru_cache(maxsize=4096)
+def _tunnel_indices(ray_key: bytes, direction_bits: int):
+    """
+    Line indices for the view down a ray of rooms.
+
+    The geometry is fully determined by the wall bits of the rooms along
+    the ray (with _EXIT marking the maze exit) and the view direction, so
+    the index list is built once per distinct signature and cached.
+    """
+    direction = Direction(direction_bits)
+    left = direction.turn_left()
+    right = direction.turn_right()
+    indices = []
+    for step, walls in enumerate(ray_key, start=1):
+        if walls == _EXIT:  # Maze Exit
+            indices.extend(
+                ((step - 1) << 3 | 0, (step - 1) << 3 | 1)
+            )  # previous left post
+            indices.extend(
+                ((step - 1) << 3 | 2, (step - 1) << 3 | 3)
+            )  # previous right post
+            indices.extend((step << 3 | 0, step << 3 | 1))  # this left post
+            indices.extend((step << 3 | 2, step << 3 | 3))  # this right post
+            break
+        if not walls & left:
+            indices.extend(((step - 1) << 3 | 4, step << 3 | 0))  # left bottom gap
+            indices.extend(((step - 1) << 3 | 5, step << 3 | 1))  # left top gap
+            left_post = True
+            if step > 0:
+                indices.extend(
+                    ((step - 1) << 3 | 0, (step - 1) << 3 | 1)
+                )  # previous left post
+        else:
+            indices.extend(((step - 1) << 3 | 0, step << 3 | 0))  # left bottom wall
+            indices.extend(((step - 1) << 3 | 1, step << 3 | 1))  # left top wall
+            left_post = False
+        if not walls & right:
+            indices.extend(((step - 1) << 3 | 6, step << 3 | 2))  # right bottom gap
+            indices.extend(((step - 1) << 3 | 7, step << 3 | 3))  # right top gap
+            right_post = True
+            if step > 0:
+                indices.extend(
+                    ((step - 1) << 3 | 2, (step - 1) << 3 | 3)
+                )  # previous right post
+        else:
+            indices.extend(((step - 1) << 3 | 2, step << 3 | 2))  # right bottom wall
+            indices.extend(((step - 1) << 3 | 3, step << 3 | 3))  # right top wall
+            right_post = False
+        if not walls & direction:
+            if left_post:
+                indices.extend((step << 3 | 0, step << 3 | 1))  # this left post
+            if right_post:
+                indices.extend((step << 3 | 2, step << 3 | 3))  # this right post
+        else:
+            if not left_post:
+                indices.extend((step << 3 | 0, step << 3 | 1))  # this left post
+            if not right_post:
+                indices.extend((step << 3 | 2, step << 3 | 3))  # this right post
+            indices.extend((step << 3 | 0, step << 3 | 2))  # end bottom wall
+            indices.extend((step << 3 | 1, step << 3 | 3))  # end top wall
+            break
+    return tuple(indices)
+
+
 @traced_methods
 class TunnelView(GameView):
     def __init__(self, game_controller, label: str = None):
         super().__init__(game_controller, label or "Tunnel View")
         self._step_max = game_controller.maze.shape.max()
-        self.indices = []
+        self.indices = ()
+        self._vertex_list = None
 
     def on_resize(self, width: int, height: int):
         self.switch_to()
         super().on_resize(width, height)
-        vertices = []
+        # Eight corners per distance, all computed in one broadcast:
+        # for step i the outer offset is limits//(i+1) and the inner
+        # offset (the next step's outer) is limits//(i+2).
         limits = np.array([width // 2, height // 2])
         centre = limits
-        next_offset = limits
-        for distance in range(2, self._step_max + 4):
-            offset = next_offset
-            next_offset = limits // distance
-            #  0. Left Bottom Outer
-            vertices.extend((centre[0] - offset[0], centre[1] - offset[1]))
-            #  1. Left Top Outer
-            vertices.extend((centre[0] - offset[0], centre[1] + offset[1]))
-            #  2. Right Bottom Outer
-            vertices.extend((centre[0] + offset[0], centre[1] - offset[1]))
-            #  3. Right Top Outer
-            vertices.extend((centre[0] + offset[0], centre[1] + offset[1]))
-            #  4. Left Bottom Inner
-            vertices.extend((centre[0] - offset[0], centre[1] - next_offset[1]))
-            #  5. Left Top Inner
-            vertices.extend((centre[0] - offset[0], centre[1] + next_offset[1]))
-            #  6. Right Bottom Inner
-            vertices.extend((centre[0] + offset[0], centre[1] - next_offset[1]))
-            #  5. Right Top Inner
-            vertices.extend((centre[0] + offset[0], centre[1] + next_offset[1]))
-        self.vertices_count = len(vertices) // 2
-        self.vertices = ("v2i", vertices)
+        offsets = limits // np.arange(1, self._step_max + 4)[:, np.newaxis]
+        outer_x = offsets[:-1, 0]
+        outer_y = offsets[:-1, 1]
+        inner_y = offsets[1:, 1]
+        # corners 0/1: Left Outer, 2/3: Right Outer, 4..7: Inner posts
+        vertices = np.empty((len(outer_x), 8, 2), dtype=np.int32)
+        vertices[:, 0, 0] = vertices[:, 1, 0] = centre[0] - outer_x
+        vertices[:, 2, 0] = vertices[:, 3, 0] = centre[0] + outer_x
+        vertices[:, 4, 0] = vertices[:, 5, 0] = centre[0] - outer_x
+        vertices[:, 6, 0] = vertices[:, 7, 0] = centre[0] + outer_x
+        vertices[:, 0, 1] = vertices[:, 2, 1] = centre[1] - outer_y
+        vertices[:, 1, 1] = vertices[:, 3, 1] = centre[1] + outer_y
+        vertices[:, 4, 1] = vertices[:, 6, 1] = centre[1] - inner_y
+        vertices[:, 5, 1] = vertices[:, 7, 1] = centre[1] + inner_y
+        self.vertices_count = vertices.size // 2
+        self.vertices = ("v2i", vertices.reshape(-1).tolist())
         self.vertices_colour = ("c4B", (255, 255, 255, 255) * self.vertices_count)
+        if self.player is not None:
+            self.display_update()
 
     def entry(self):
         super().entry()
@@ -56,82 +125,43 @@ class TunnelView(GameView):
         assert self.player is not None
         self.switch_to()
         direction = self.player.direction
-        left = direction.turn_left()
-        right = direction.turn_right()
-        position = self.player.position.copy()
-        indices = []
-        for step in range(1, self._step_max + 3):
-            if not direction:  # Beyond the far wall
-                pass
-            elif position not in self.game_controller.maze:  # Maze Exit
-                indices.extend(
-                    ((step - 1) << 3 | 0, (step - 1) << 3 | 1)
-                )  # previous left post
-                indices.extend(
-                    ((step - 1) << 3 | 2, (step - 1) << 3 | 3)
-                )  # previous right post
-                indices.extend((step << 3 | 0, step << 3 | 1))  # this left post
-                indices.extend((step << 3 | 2, step << 3 | 3))  # this right post
+        if not direction:  # Beyond the far wall
+            self.indices = ()
+            return
+        # Collect the wall-bit signature of the rooms along the view ray;
+        # the index geometry is then a pure function of that signature.
+        maze = self.game_controller.maze
+        walls = maze._walls
+        size_x, size_y = walls.shape
+        x, y = self.player.position
+        dx, dy = direction.offset()
+        ray = []
+        for _ in range(1, self._step_max + 3):
+            if not (0 <= x < size_x and 0 <= y < size_y):  # Maze Exit
+                ray.append(_EXIT)
+                break
+            room_walls = int(walls[x, y])
+            ray.append(room_walls)
+            if room_walls & direction:  # facing a wall
                 break
-            else:
-                room = self.game_controller.maze[position]
-                if room.can_move(left):
-                    indices.extend(
-                        ((step - 1) << 3 | 4, step << 3 | 0)
-                    )  # left bottom gap
-                    indices.extend(((step - 1) << 3 | 5, step << 3 | 1))  # left top gap
-                    left_post = True
-                    if step > 0:
-                        indices.extend(
-                            ((step - 1) << 3 | 0, (step - 1) << 3 | 1)
-                        )  # previous left post
-                else:
-                    indices.extend(
-                        ((step - 1) << 3 | 0, step << 3 | 0)
-                    )  # left bottom wall
-                    indices.extend(
-                        ((step - 1) << 3 | 1, step << 3 | 1)
-                    )  # left top wall
-                    left_post = False
-                if room.can_move(right):
-                    indices.extend(
-                        ((step - 1) << 3 | 6, step << 3 | 2)
-                    )  # right bottom gap
-                    indices.extend(
-                        ((step - 1) << 3 | 7, step << 3 | 3)
-                    )  # right top gap
-                    right_post = True
-                    if step > 0:
-                        indices.extend(
-                            ((step - 1) << 3 | 2, (step - 1) << 3 | 3)
-                        )  # previous right post
-                else:
-                    indices.extend(
-                        ((step - 1) << 3 | 2, step << 3 | 2)
-                    )  # right bottom wall
-                    indices.extend(
-                        ((step - 1) << 3 | 3, step << 3 | 3)
-                    )  # right top wall
-                    right_post = False
-                if room.can_move(direction):
-                    if left_post:
-                        indices.extend((step << 3 | 0, step << 3 | 1))  # this left post
-                    if right_post:
-                        indices.extend(
-                            (step << 3 | 2, step << 3 | 3)
-                        )  # this right post
-                    position += direction.offset()
-                else:
-                    if not left_post:
-                        indices.extend((step << 3 | 0, step << 3 | 1))  # this left post
-                    if not right_post:
-                        indices.extend(
-                            (step << 3 | 2, step << 3 | 3)
-                        )  # this right post
-                    indices.extend((step << 3 | 0, step << 3 | 2))  # end bottom wall
-                    indices.extend((step << 3 | 1, step << 3 | 3))  # end top wall
-                    break
-        self.indices = indices
+            x += dx
+            y += dy
+        self.indices = _tunnel_indices(bytes(ray), int(direction))
+        self._rebuild_vertex_list()
+
+    def _rebuild_vertex_list(self):
+        # one persistent indexed vertex list, rebuilt per pose change;
+        # on_draw then just draws the resident buffer
+        if self._vertex_list is not None:
+            self._vertex_list.delete()
+            self._vertex_list = None
+        if self.indices:
+            self._vertex_list = pyglet.graphics.vertex_list_indexed(
+                self.vertices_count,
+                self.indices,
+                self.vertices,
+                self.vertices_colour,
+            )
 
     def on_direction_update(self):
         self.display_update()
@@ -144,13 +174,8 @@ class TunnelView(GameView):
         if self.active and self.player is not None:
             self.switch_to()
             self.clear()
-            pyglet.graphics.draw_indexed(
-                self.vertices_count,
-                pyglet.gl.GL_LINES,
-                self.indices,
-                self.vertices,
-                self.vertices_colour,
-            )
+            if self._vertex_list is not None:
+                self._vertex_list.draw(pyglet.gl.GL_LINES)
 
 
 __all__ = "TunnelView"
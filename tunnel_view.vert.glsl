@@ -1,12 +1,13 @@
 #version 300 es
 layout(location = 0) in vec3 position;
 layout(location = 1) in vec2 texture;
-uniform mat4 transform;
+uniform mat4 projection;
+uniform mat4 view;
 
 out vec2 v_texture;
 
 void main()
 {
-	gl_Position = transform * vec4(position, 1.0f);
+	gl_Position = projection * view * vec4(position, 1.0f);
 	v_texture = texture;
 }
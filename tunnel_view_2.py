@@ -4,16 +4,51 @@ tunnel_view_2.py
 Copyright 2023 Steve Palmer
 """
 
+import ctypes
+import math
+
 import pyglet
 import pyglet.gl as gl
 import numpy as np
-import pyrr
 
 from utils import traced_methods, do_not_trace
 from direction import Direction
 from game_controller import GameView
 
-from gl_utils import GLProgram, GLShader, GLShape, look_at
+from gl_utils import GLProgram, GLShader, GLShapeBatch, look_at
+from maze_kernels import njit
+
+
+_HALF_PI = float(np.pi / 2.0)
+# float32, matching the camera arrays (see _wrap_theta_kernel)
+_PI_F32 = np.float32(np.pi)
+_TWO_PI_F32 = np.float32(2.0) * _PI_F32
+# facing components (-sin, cos) of the four settled bearings, indexed
+# by Direction.right_angle_bearing(); trig is only needed mid-turn
+_DIR_TABLE = ((0.0, 1.0), (-1.0, 0.0), (0.0, -1.0), (1.0, 0.0))
+
+
+@njit(cache=True)
+def _camera_kernel(x, y, bearing, out):
+    """Fill out with the camera pose (x, y, bearing as radians)."""
+    out[0] = x
+    out[1] = y
+    out[2] = bearing * _HALF_PI
+
+
+@njit(cache=True)
+def _wrap_theta_kernel(theta):
+    """Fold a bearing delta into [-pi, pi] so turns animate the short way.
+
+    Kept in float32 throughout, matching the camera arrays: a reversal
+    is exactly +/-float32(pi) and must not wrap, or the half-turn would
+    animate the other way round.
+    """
+    if theta > _PI_F32:
+        theta -= _TWO_PI_F32
+    elif theta < -_PI_F32:
+        theta += _TWO_PI_F32
+    return theta
 
 
 @traced_methods
@@ -26,36 +61,35 @@ class TunnelView2(GameView):
 
         self.ground_level = 0.0
         self.wall_level = 0.75
+        # eye height, fixed for the life of the view
+        self._camera_y = (self.ground_level + self.wall_level) * 0.5
         gravel_scale = 3.0
         maze = game_controller.maze
-        self.ground = GLShape(
-            np.array(
-                [
-                    ((-1, self.ground_level, 1), (0.0, 0.0)),  # 0
-                    (
-                        (-1, self.ground_level, -maze.shape[1] - 1),
-                        (0.0, gravel_scale * (maze.shape[1] + 2)),
-                    ),  # 1
-                    (
-                        (maze.shape[0] + 1, self.ground_level, -maze.shape[1] - 1),
-                        (
-                            gravel_scale * (maze.shape[0] + 2),
-                            gravel_scale * (maze.shape[1] + 2),
-                        ),
-                    ),  # 2
+        # the ground geometry is held until build_walls folds everything
+        # into one batch
+        self._ground_vertices = np.array(
+            [
+                ((-1, self.ground_level, 1), (0.0, 0.0)),  # 0
+                (
+                    (-1, self.ground_level, -maze.shape[1] - 1),
+                    (0.0, gravel_scale * (maze.shape[1] + 2)),
+                ),  # 1
+                (
+                    (maze.shape[0] + 1, self.ground_level, -maze.shape[1] - 1),
                     (
-                        (maze.shape[0] + 1, self.ground_level, 0.0),
-                        (gravel_scale * (maze.shape[0] + 2), 0.0),
+                        gravel_scale * (maze.shape[0] + 2),
+                        gravel_scale * (maze.shape[1] + 2),
                     ),
-                ],  # 3
-                dtype=[("position", np.float32, 3), ("texture", np.float32, 2)],
-            ),
-            np.array([0, 1, 2, 3], dtype=np.uint32),
-            gl.GL_QUADS,
-            "gravel.jpg",
+                ),  # 2
+                (
+                    (maze.shape[0] + 1, self.ground_level, 0.0),
+                    (gravel_scale * (maze.shape[0] + 2), 0.0),
+                ),
+            ],  # 3
+            dtype=[("position", np.float32, 3), ("texture", np.float32, 2)],
         )
-        self.walls = None
-        self.egress = None
+        self._ground_indices = np.array([0, 1, 2, 0, 2, 3], dtype=np.uint32)
+        self.batch = None
 
         self.program = GLProgram(
             (
@@ -68,14 +102,33 @@ class TunnelView2(GameView):
             do_use=True,
         )
 
-        # Uniform
-        self.transform_loc = gl.glGetUniformLocation(self.program.gl_id, b"transform")
+        # Uniforms; projection and view are multiplied in the vertex
+        # shader, so no per-frame matmul happens Python-side
+        self.projection_loc = gl.glGetUniformLocation(
+            self.program.gl_id, b"projection"
+        )
+        self.view_loc = gl.glGetUniformLocation(self.program.gl_id, b"view")
 
         self.cummulative_time = 0.0
 
+        # projection only depends on the window aspect; rebuilt lazily
+        # after a resize rather than every frame.  Both matrices are
+        # filled in place, so no 4x4 is allocated per update.
+        self._projection = None
+        self._proj_buf = np.empty((4, 4), dtype=np.float32)
+        self._view_buf = np.empty((4, 4), dtype=np.float32)
+        # camera position and facing, likewise written in place per
+        # frame; the direction's y component never leaves 0
+        self._cam_buf = np.empty((3,), dtype=np.float32)
+        self._dir_buf = np.zeros((3,), dtype=np.float32)
+        # set whenever the pose or window changes; once the camera has
+        # settled the scheduled 100 Hz tick re-uploads nothing
+        self._dirty = True
+
     def entry(self):
         super().entry()
         self.target_camera = TunnelView2.player_camera(self.player)
+        self._target_bearing = self.player.direction.right_angle_bearing()
         self.target_time = self.cummulative_time
         self.display_update()
         pyglet.clock.schedule_interval(self.scheduled_update, 0.01)
@@ -84,54 +137,67 @@ class TunnelView2(GameView):
         pyglet.clock.unschedule(self.scheduled_update)
         super().exit()
 
+    @do_not_trace
     @staticmethod
     def player_camera(player):
-        return np.array(
-            [
-                player.position[0],
-                player.position[1],
-                player.direction.right_angle_bearing() * np.pi / 2.0,
-            ],
-            dtype=np.float32,
+        # a fresh array each time: the delta arithmetic needs the old
+        # target to survive the update
+        camera = np.empty((3,), dtype=np.float32)
+        _camera_kernel(
+            player.position[0],
+            player.position[1],
+            player.direction.right_angle_bearing(),
+            camera,
         )
+        return camera
 
     def add_player(self, player):
         super().add_player(player)
         self.target_camera = TunnelView2.player_camera(player)
+        self._target_bearing = player.direction.right_angle_bearing()
         self.target_time = self.cummulative_time
+        self._dirty = True
 
     def build_walls(self):
         wall_plan = self.game_controller.maze.wall_2d_vertices(0.075)
         wall_plan_len = wall_plan.shape[0]
-        wall_vertices = np.recarray(
+        # plain structured array: the fields are only ever reached by
+        # ["..."] indexing, so recarray's attribute machinery is not
+        # needed and the field views stay cheap
+        wall_vertices = np.empty(
             (wall_plan_len * 2,),
             dtype=[("position", np.float32, 3), ("texture", np.float32, 2)],
         )
-        wall_vertices["position"][::2, 0] = wall_plan[:, 0]
-        wall_vertices["position"][1::2, 0] = wall_plan[:, 0]
-        wall_vertices["position"][::2, 2] = -wall_plan[:, 1]
-        wall_vertices["position"][1::2, 2] = -wall_plan[:, 1]
-        wall_vertices["position"][::2, 1] = self.ground_level
-        wall_vertices["position"][1::2, 1] = self.wall_level
-        wall_vertices["texture"][0, 0] = 0.0
-        wall_vertices["texture"][1, 0] = 0.0
-        wall_vertices["texture"][::2, 1] = 0.0
-        wall_vertices["texture"][1::2, 1] = 1.0
-        distance = np.fabs(wall_plan[1:, 0] - wall_plan[:-1, 0]) + np.fabs(
-            wall_plan[1:, 1] - wall_plan[:-1, 1]
-        )
-        distance = np.cumsum(distance)
-        wall_vertices["texture"][2::2, 0] = distance
-        wall_vertices["texture"][3::2, 0] = distance
+        # ground and top rows of each post seen as one (n, 2, 3) block,
+        # so x and z broadcast down both rows in a single pass each
+        position = wall_vertices["position"].reshape(wall_plan_len, 2, 3)
+        position[:, :, 0] = wall_plan[:, 0, np.newaxis]
+        position[:, :, 2] = -wall_plan[:, 1, np.newaxis]
+        position[:, 0, 1] = self.ground_level
+        position[:, 1, 1] = self.wall_level
+        # The walls run axis-aligned, so the panel length is the L1 step
+        # between consecutive plan points; accumulated in place and
+        # broadcast into both rows of each post through a reshaped view.
+        texture = wall_vertices["texture"].reshape(wall_plan_len, 2, 2)
+        texture[:, 0, 1] = 0.0
+        texture[:, 1, 1] = 1.0
+        texture[0, :, 0] = 0.0
+        distance = np.abs(np.diff(wall_plan, axis=0)).sum(axis=1)
+        np.cumsum(distance, out=distance)
+        texture[1:, :, 0] = distance[:, np.newaxis]
+        # each panel pre-split into two triangles; GL_QUADS is
+        # deprecated and ends up converted by the driver anyway
         wall_panels = wall_plan_len - 1
-        wall_indices = np.empty((wall_panels * 4), dtype=np.uint32)
-        wall_indices[::4] = np.arange(0, wall_panels * 2, 2)
-        wall_indices[1::4] = wall_indices[::4] + 1
-        wall_indices[2::4] = wall_indices[::4] + 3
-        wall_indices[3::4] = wall_indices[::4] + 2
-        self.walls = GLShape(wall_vertices, wall_indices, gl.GL_QUADS, "hedge.jpg")
-
-        exit_vertices = np.recarray(
+        base = np.arange(0, wall_panels * 2, 2, dtype=np.uint32)
+        wall_indices = np.empty((wall_panels * 6), dtype=np.uint32)
+        wall_indices[::6] = base
+        wall_indices[1::6] = base + 1
+        wall_indices[2::6] = base + 3
+        wall_indices[3::6] = base
+        wall_indices[4::6] = base + 3
+        wall_indices[5::6] = base + 2
+
+        exit_vertices = np.empty(
             (4,), dtype=[("position", np.float32, 3), ("texture", np.float32, 2)]
         )
         exit_vertices["position"][:2] = wall_vertices["position"][:2]
@@ -144,64 +210,103 @@ class TunnelView2(GameView):
         exit_vertices["texture"][2, 1] = 0.0
         exit_vertices["texture"][3, 0] = 0.0
         exit_vertices["texture"][3, 1] = 1.0
-        exit_indices = np.empty((4,), dtype=np.uint32)
-        exit_indices[0] = 0
-        exit_indices[1] = 1
-        exit_indices[2] = 3
-        exit_indices[3] = 2
-        self.egress = GLShape(exit_vertices, exit_indices, gl.GL_QUADS, "exit2.jpg")
-
-    _target_offset = {
-        Direction.North: -pyrr.vector3.create_unit_length_z(dtype=np.float32),
-        Direction.East: pyrr.vector3.create_unit_length_x(dtype=np.float32),
-        Direction.South: pyrr.vector3.create_unit_length_z(dtype=np.float32),
-        Direction.West: -pyrr.vector3.create_unit_length_x(dtype=np.float32),
-    }
+        exit_indices = np.array([0, 1, 3, 0, 3, 2], dtype=np.uint32)
+
+        # ground, walls and egress share the shader and transform, so
+        # they draw from one vertex array with one index range per
+        # texture instead of a full bind cycle per shape
+        batch = GLShapeBatch()
+        batch.add(
+            self._ground_vertices, self._ground_indices, gl.GL_TRIANGLES, "gravel.jpg"
+        )
+        batch.add(wall_vertices, wall_indices, gl.GL_TRIANGLES, "hedge.jpg")
+        batch.add(exit_vertices, exit_indices, gl.GL_TRIANGLES, "exit2.jpg")
+        batch.finalize()
+        self.batch = batch
 
+    @do_not_trace
     def display_update(self):
         assert self.player is not None
         self.switch_to()
 
-        if self.walls is None:
+        if self.batch is None:
             self.build_walls()
 
         # view
         if self.cummulative_time >= self.target_time:
             pc = self.target_camera
+            facing = _DIR_TABLE[self._target_bearing]
         else:
             pc = self.target_camera - self.delta_camera * (
                 max(self.target_time - self.cummulative_time, 0.0) / self.delta_time
             )
+            facing = None
 
-        camera = pyrr.vector3.create(
-            pc[0] + 0.5,
-            (self.ground_level + self.wall_level) / 2.0,
-            -pc[1] - 0.5,
-            dtype=np.float32,
-        )
-        direction = pyrr.vector3.create(-np.sin(pc[2]), 0.0, np.cos(pc[2]))
-        view = look_at(camera, direction=direction)
-        transform = view
+        camera = self._cam_buf
+        camera[0] = pc[0] + 0.5
+        camera[1] = self._camera_y
+        camera[2] = -pc[1] - 0.5
+        direction = self._dir_buf
+        if facing is None:
+            # mid-turn: scalar trig of the interpolated bearing;
+            # math.sin/cos skip the ndarray dispatch np's take
+            theta = float(pc[2])
+            direction[0] = -math.sin(theta)
+            direction[2] = math.cos(theta)
+        else:
+            direction[0] = facing[0]
+            direction[2] = facing[1]
+        view = look_at(camera, direction=direction, out=self._view_buf)
 
-        # then project
-        projection = pyrr.matrix44.create_perspective_projection_matrix(
-            90.0, self.width / self.height, 0.1, 1000.0, dtype=np.float32
-        ).T
-        transform = np.dot(projection, transform)
+        # projection is uploaded only when a resize has invalidated it;
+        # the shader multiplies the two uniforms
+        if self._projection is None:
+            self._projection = self._build_projection()
+            gl.glUniformMatrix4fv(
+                self.projection_loc,  # location
+                1,  # count
+                gl.GL_TRUE,  # Numpy uses Row-Dominant, OpenGL used Column-Dominant
+                self._projection.ctypes.data_as(ctypes.POINTER(gl.GLfloat)),
+            )  # value
 
+        # the matrices are contiguous float32, so their buffers go to GL
+        # directly with no per-element conversion or flatten copy
         gl.glUniformMatrix4fv(
-            self.transform_loc,  # location
+            self.view_loc,  # location
             1,  # count
             gl.GL_TRUE,  # Numpy uses Row-Dominant, OpenGL used Column-Dominant
-            (gl.GLfloat * transform.size)(*transform.flatten()),
+            view.ctypes.data_as(ctypes.POINTER(gl.GLfloat)),
         )  # value
 
+        # keep updating while the camera is still animating
+        self._dirty = self.cummulative_time < self.target_time
+
+    def _build_projection(self, fovy=90.0, near=0.1, far=1000.0):
+        """
+        The perspective projection, written straight into the instance
+        buffer; it has only five non-zero entries, so pyrr's factory
+        (and its intermediate allocations) is not needed.
+        """
+        focal = 1.0 / math.tan(math.radians(fovy) / 2.0)
+        out = self._proj_buf
+        out[:] = 0.0
+        out[0, 0] = focal * self.height / self.width
+        out[1, 1] = focal
+        out[2, 2] = (far + near) / (near - far)
+        out[2, 3] = 2.0 * far * near / (near - far)
+        out[3, 2] = -1.0
+        return out
+
+    @do_not_trace
     def on_resize(self, width: int, height: int):
         self.switch_to()
         gl.glViewport(0, 0, width, height)
+        self._projection = None
+        self._dirty = True
         if self.player is not None:
             self.display_update()
 
+    @do_not_trace
     def _calculate_delta(self, duration: float = 0.2):
         if self.cummulative_time >= self.target_time:
             previous_camera = self.target_camera
@@ -211,20 +316,20 @@ class TunnelView2(GameView):
                 * (max(self.target_time - self.cummulative_time, 0.0) / self.delta_time)
             )
         self.target_camera = TunnelView2.player_camera(self.player)
+        self._target_bearing = self.player.direction.right_angle_bearing()
         self.delta_time = duration
         self.target_time = self.cummulative_time + self.delta_time
         self.delta_camera = self.target_camera - previous_camera
-        theta = self.delta_camera[2]
-        if theta > np.pi:
-            self.delta_camera[2] -= 2.0 * np.pi
-        elif theta < -np.pi:
-            self.delta_camera[2] += 2.0 * np.pi
+        self.delta_camera[2] = _wrap_theta_kernel(self.delta_camera[2])
+        self._dirty = True
 
+    @do_not_trace
     def on_direction_update(self):
         assert self.player is not None
         self._calculate_delta()
         self.display_update()
 
+    @do_not_trace
     def on_position_update(self):
         assert self.player is not None
         self._calculate_delta()
@@ -235,16 +340,14 @@ class TunnelView2(GameView):
         if self.active and self.player is not None:
             self.switch_to()
             self.clear()
-            self.ground.draw()
-            if self.walls is not None:
-                self.walls.draw()
-            if self.egress is not None:
-                self.egress.draw()
+            if self.batch is not None:
+                self.batch.draw()
 
     @do_not_trace
     def scheduled_update(self, dt):
         self.cummulative_time += dt
-        self.display_update()
+        if self._dirty:
+            self.display_update()
 
 
 if __name__ == "__main__":
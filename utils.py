@@ -6,6 +6,22 @@ Copyright 2023 Steve Palmer
 
 from functools import wraps, partial
 import logging
+import os
+import threading
+
+
+# The tracing and checking instrumentation is resolved once, at import
+# time: unless the MAZE_TRACE / MAZE_CHECK environment variables are set
+# (and asserts are enabled), the decorators below hand back the original
+# function or class untouched, so a normal run carries no wrapper cost.
+# MAZE_TRACE=static goes one step further and also drops the wrapper
+# from any function whose level cannot reach its logger as configured
+# at decoration time; that skips the per-call isEnabledFor check, but a
+# logging config loaded later (app.py reads logging.conf in main, after
+# the view modules import) cannot re-enable those traces.
+_TRACE_ENABLED = __debug__ and bool(os.environ.get("MAZE_TRACE"))
+_TRACE_STATIC = os.environ.get("MAZE_TRACE") == "static"
+_CHECK_ENABLED = __debug__ and bool(os.environ.get("MAZE_CHECK"))
 
 
 # ======================================================================================================================
@@ -44,7 +60,7 @@ def traced(
         already_traced = func._traced
     except AttributeError:
         already_traced = False
-    if not __debug__ or already_traced:
+    if not _TRACE_ENABLED or already_traced:
         return func
     if level is None:
         level = logging.DEBUG
@@ -63,8 +79,19 @@ def traced(
     elif with_result:
         on_exit = True
 
+    if _TRACE_STATIC and not log.isEnabledFor(level):
+        return func
+
+    # bound once here so the wrapper's guard is a plain call, not an
+    # attribute lookup per invocation
+    enabled_for = log.isEnabledFor
+
     @wraps(func)
     def wrapper(*args, **kwargs):
+        # the message builds below (qualname concatenation and repr of
+        # every parameter) are wasted work when the logger is muted
+        if not enabled_for(level):
+            return func(*args, **kwargs)
         logmsg = func.__qualname__
         if with_params:
             fields = [repr(arg) for arg in args] + [
@@ -86,7 +113,7 @@ def traced(
 
 
 def do_not_trace(func):
-    if __debug__:
+    if _TRACE_ENABLED:
         setattr(func, "_traced", True)
     return func
 
@@ -94,8 +121,16 @@ def do_not_trace(func):
 def traced_methods(cls=None, **kwargs):
     if cls is None:
         return partial(traced_methods, **kwargs)
-    # return cls
+    if not _TRACE_ENABLED:
+        return cls
     for name, method in vars(cls).items():
+        # dunders (construction, protocol hooks) and static/class
+        # method descriptors are left alone; the latter are helpers
+        # like TunnelView2.player_camera that sit on hot paths
+        if name.startswith("__"):
+            continue
+        if isinstance(method, (staticmethod, classmethod)):
+            continue
         if callable(method):
             setattr(cls, name, traced(method, **kwargs))
     return cls
@@ -107,7 +142,7 @@ def traced_methods(cls=None, **kwargs):
 
 
 def _set_check_type(method, type_):
-    if __debug__:
+    if _CHECK_ENABLED:
         setattr(method, "_check_type", type_)
     return method
 
@@ -139,8 +174,7 @@ def do_not_check(method):
 def method_checked(method=None, *, checker):
     if method is None:
         return partial(method_checked, checker=checker)
-    # return method
-    if not __debug__:
+    if not _CHECK_ENABLED:
         return method
 
     @wraps(method)
@@ -168,8 +202,7 @@ def method_checked(method=None, *, checker):
 def checked_methods(cls=None, *, checker=None):
     if cls is None:
         return partial(checked_methods, checker=checker)
-    # return cls
-    if __debug__:
+    if _CHECK_ENABLED:
         if isinstance(checker, str):
             checker = getattr(cls, checker)
         else:
@@ -196,12 +229,20 @@ def checked_methods(cls=None, *, checker=None):
 class Singleton(type):
     def __init__(self, *args, **kwargs):
         self.__instance = None
+        self.__lock = threading.Lock()
         super().__init__(*args, **kwargs)
 
     def __call__(self, *args, **kwargs):
-        if self.__instance is None:
-            self.__instance = super().__call__(*args, **kwargs)
-        return self.__instance
+        # one attribute fetch and one is-check on the fast path; the
+        # lock is only ever taken before the instance exists
+        instance = self.__instance
+        if instance is None:
+            with self.__lock:
+                instance = self.__instance
+                if instance is None:
+                    instance = super().__call__(*args, **kwargs)
+                    self.__instance = instance
+        return instance
 
 
 __all__ = (